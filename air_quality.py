@@ -0,0 +1,32 @@
+from sklearn.neighbors import BallTree
+import numpy as np
+
+POLLUTANTS = ['NO2', 'PM25', 'PM10']
+
+# air quality index function
+def aqi(edge_data, pollutant):
+    aqi_data = edge_data[pollutant.upper()].split(' ')[0]
+    if aqi_data.startswith('>'):
+        aqi_value = 1.5 * float(aqi_data[1:])
+    else:
+        aqi_range = [float(n) for n in aqi_data.split('-')]
+        aqi_value = (aqi_range[0] + aqi_range[0]) / 2
+    return aqi_value
+
+# exposure function
+def exposure(edge_data):
+    return edge_data['length'] * edge_data['aqi']
+
+def aqi_ball_tree(aqi_dataset):
+    aqi_nodes_rad = np.deg2rad(aqi_dataset[['LATITUDE', 'LONGITUDE']]) # haversine requires lat, lon coordinates in radians
+    return BallTree(aqi_nodes_rad, metric='haversine')
+
+def store_closest_aqi(G, u, v, k, aqi_dataset, ball_tree):
+    # find the closest point in air quality index dataset to the middle of the current edge
+    middle_latlon = (G.nodes[u]['y'] + G.nodes[v]['y']) / 2, (G.nodes[u]['x'] + G.nodes[v]['x']) / 2
+    middle_latlon_rad = np.deg2rad(middle_latlon)
+    dist, idx = ball_tree.query(middle_latlon_rad.reshape(1, -1), k=1)
+    closest = aqi_dataset.iloc[idx[:, 0]]
+    # store air quality indices of closest point on the current edge
+    for pollutant in POLLUTANTS:
+        G[u][v][k][pollutant] = closest[[pollutant]].values[0].item()
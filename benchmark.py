@@ -0,0 +1,423 @@
+import multiprocessing as mp
+import argparse as ap
+import networkx as nx
+import pandas as pd
+import osmnx as ox
+import numpy as np
+import statistics
+import subprocess
+import tempfile
+import platform
+import resource
+import tracemalloc
+import pickle
+import random
+import json
+import time
+import sys
+import os
+import re
+
+from mamp import MAMP, MAMP_epoch, expand_mask
+from air_quality import POLLUTANTS, aqi, exposure, aqi_ball_tree, store_closest_aqi
+from routes import route_json
+
+# bounding box (lat, lon) roughly covering Barcelona
+BBOX = ((41.35, 2.10), (41.45, 2.23))
+EARTH_RADIUS = 6371009
+
+# range of the synthetic values of each pollutant in POLLUTANTS
+SYNTHETIC_RANGES = {
+    'NO2': (10, 60),
+    'PM25': (5, 25),
+    'PM10': (10, 40),
+}
+
+# parameter code and acronym of the measures of each sensor (only NO2 and PM10, as in data/test.json)
+SENSOR_MEASURES = {
+    'NO2': ('03', 'NO<sub>2</sub>'),
+    'PM10': ('12', 'PM<sub>10</sub>'),
+}
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.deg2rad, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+def aqi_range_string(rng, low, high):
+    # same format as the 'Rang' column of Open Data BCN (e.g., "20-25 µg/m³" or ">50 µg/m³")
+    if rng.random() < 0.05:
+        return f'>{high} µg/m³'
+    start = rng.randrange(low, high, 5)
+    return f'{start}-{start + 5} µg/m³'
+
+def to_walk_graph(nodes, edges, rng):
+    # emulate an osmnx walk graph: MultiDiGraph with both directions for each street segment
+    G = nx.MultiDiGraph(crs='epsg:4326')
+    for node, (lat, lon) in enumerate(nodes):
+        G.add_node(node, y=lat, x=lon)
+    for u, v in edges:
+        length = haversine(nodes[u][0], nodes[u][1], nodes[v][0], nodes[v][1]).item()
+        attributes = {'length': length}
+        for pollutant in POLLUTANTS:
+            attributes[pollutant] = aqi_range_string(rng, *SYNTHETIC_RANGES[pollutant])
+        G.add_edge(u, v, **attributes)
+        G.add_edge(v, u, **attributes)
+    return G
+
+def grid_graph(target_edges, rng):
+    # a side x side grid has 4 * side * (side - 1) directed edges
+    side = max(2, int(np.ceil((1 + np.sqrt(1 + target_edges)) / 2)))
+    lats = np.linspace(BBOX[0][0], BBOX[1][0], side)
+    lons = np.linspace(BBOX[0][1], BBOX[1][1], side)
+    nodes = [(lat, lon) for lat in lats for lon in lons]
+    edges = []
+    for i in range(side):
+        for j in range(side):
+            if j + 1 < side:
+                edges.append((i * side + j, i * side + j + 1))
+            if i + 1 < side:
+                edges.append((i * side + j, (i + 1) * side + j))
+    return to_walk_graph(nodes, edges, rng)
+
+def geometric_graph(target_edges, rng, degree=6):
+    # random geometric graph in the unit square, with the radius chosen to get the desired average degree
+    n = max(2, target_edges // degree)
+    radius = np.sqrt(degree / (np.pi * n))
+    H = nx.random_geometric_graph(n, radius, seed=rng.randrange(2**32))
+    # keep the largest connected component so that routing always succeeds
+    H = H.subgraph(max(nx.connected_components(H), key=len))
+    index = {node: i for i, node in enumerate(H.nodes)}
+    nodes = []
+    for node in H.nodes:
+        x, y = H.nodes[node]['pos']
+        nodes.append((BBOX[0][0] + y * (BBOX[1][0] - BBOX[0][0]), BBOX[0][1] + x * (BBOX[1][1] - BBOX[0][1])))
+    edges = [(index[u], index[v]) for u, v in H.edges]
+    return to_walk_graph(nodes, edges, rng)
+
+GRAPHS = {
+    'grid': grid_graph,
+    'geometric': geometric_graph,
+}
+
+def fake_aqi_dataset(n, rng):
+    # same columns as 2022_locations_aqi.csv (see data/process_historical_data.py)
+    rows = []
+    for i in range(n):
+        row = {
+            'TRAM': f'T{i:05d}B',
+            'LATITUDE': rng.uniform(BBOX[0][0], BBOX[1][0]),
+            'LONGITUDE': rng.uniform(BBOX[0][1], BBOX[1][1]),
+        }
+        for pollutant in POLLUTANTS:
+            row[pollutant] = aqi_range_string(rng, *SYNTHETIC_RANGES[pollutant])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def fake_sensors(n, rng):
+    # same structure as data/test.json (see data/fetch_real_time_data.py)
+    sensors = []
+    for i in range(n):
+        measures = []
+        for pollutant, (code, acronym) in SENSOR_MEASURES.items():
+            low, high = SYNTHETIC_RANGES[pollutant]
+            measures.append({
+                'parameter_code': code,
+                'parameter': pollutant,
+                'unit': 'µg/m³',
+                'date': '21/4/2024',
+                'time': '19:00',
+                'value': str(rng.randint(low, 2 * high)),
+                'datetime': '2024-04-21 19:00:00',
+                'status': 'bona',
+                'status_text': 'Bona',
+                'color': '#37a2ce',
+                'acronym': acronym,
+            })
+        sensors.append({
+            'code': f'S{i}',
+            'name': f'Sensor {i}',
+            'latitude': f'{rng.uniform(BBOX[0][0], BBOX[1][0]):.6f}',
+            'longitude': f'{rng.uniform(BBOX[0][1], BBOX[1][1]):.6f}',
+            'measures': measures,
+        })
+    return sensors
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def current_rss_mb():
+    # current resident set size is only available on Linux, fall back to the peak elsewhere
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+def time_stage(results, name, fn, args, setup=None, **info):
+    # time fn over several repetitions and then trace its memory in a separate run,
+    # setup (if any) is not measured and provides a fresh input to each run
+    rss_before = current_rss_mb()
+    times = []
+    for _ in range(args.repeat):
+        inputs = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        value = fn(*inputs)
+        times.append(time.perf_counter() - start)
+    result = {
+        'seconds': min(times),
+        'seconds_median': statistics.median(times),
+        'seconds_mad': statistics.median(abs(t - statistics.median(times)) for t in times),
+        'repeat': args.repeat,
+        'rss_before_mb': rss_before,
+        'rss_after_mb': current_rss_mb(),
+        **info,
+    }
+    if args.trace_memory:
+        inputs = () if setup is None else (setup(),)
+        tracemalloc.start()
+        fn(*inputs)
+        result['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        del inputs
+    results[name] = result
+    line = f"  {name:<24} {result['seconds_median']:10.4f} s"
+    if 'traced_peak_mb' in result:
+        line += f" {result['traced_peak_mb']:10.2f} MB"
+    print(line)
+    return value
+
+# arguments defining the workload, results are only comparable if they are the same
+WORKLOAD_ARGS = ['pollutant', 'aqi_points', 'match_edges', 'sensors', 'sensor_radius', 'mamp_epochs', 'routes', 'seed']
+
+def run(graph_type, target_edges, args):
+    # each input has its own random stream, so that changing one argument does not change the other inputs
+    rng = lambda name: random.Random(f'{args.seed}-{name}')
+    print(f'Generating {graph_type} graph with ~{target_edges} edges')
+    G = GRAPHS[graph_type](target_edges, rng('graph'))
+    aqi_dataset = fake_aqi_dataset(args.aqi_points, rng('aqi'))
+    sensors = fake_sensors(args.sensors, rng('sensors'))
+    results = {}
+
+    # graph load
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl = os.path.join(tmp, 'graph.pkl')
+        with open(pkl, 'wb') as f:
+            pickle.dump(G, f, pickle.HIGHEST_PROTOCOL)
+        del G
+        def graph_load():
+            with open(pkl, 'rb') as f:
+                return pickle.load(f)
+        G = time_stage(results, 'graph_load', graph_load, args, bytes=os.path.getsize(pkl))
+
+    # matching loop of data/precompute_graph.py (on a sample of edges, since it is very slow)
+    edges = list(G.edges)
+    sample = edges if args.match_edges <= 0 else rng('sample').sample(edges, min(args.match_edges, len(edges)))
+    def precompute_matching():
+        ball_tree = aqi_ball_tree(aqi_dataset)
+        for u, v, k in sample:
+            store_closest_aqi(G, u, v, k, aqi_dataset, ball_tree)
+    time_stage(results, 'precompute_matching', precompute_matching, args, edges=len(sample))
+    results['precompute_matching']['seconds_per_edge'] = \
+        results['precompute_matching']['seconds'] / max(1, len(sample))
+
+    # air quality index parsing and exposure (as in green-route.py)
+    def aqi_parsing():
+        for u, v, k in G.edges:
+            G[u][v][k]['aqi'] = aqi(G[u][v][k], args.pollutant)
+            G[u][v][k]['exposure'] = exposure(G[u][v][k])
+    time_stage(results, 'aqi_parsing', aqi_parsing, args, edges=len(edges))
+
+    # routing searches
+    nodes = list(G.nodes)
+    rng_pairs = rng('pairs')
+    pairs = [tuple(rng_pairs.sample(nodes, 2)) for _ in range(args.routes)]
+    def routes(weight):
+        return lambda: [nx.bidirectional_dijkstra(G, o, d, weight=weight) for o, d in pairs]
+    shortest = time_stage(results, 'route_shortest', routes('length'), args, routes=len(pairs))
+    historical = time_stage(results, 'route_historical', routes('exposure'), args, routes=len(pairs))
+
+    # sensor snapshot to nodes (as in green-route.py)
+    def sensor_mapping():
+        sensor_nodes_aqi = {}
+        for sensor in sensors:
+            sensor_node = ox.nearest_nodes(G, float(sensor['longitude']), float(sensor['latitude']))
+            for measure in sensor['measures']:
+                if args.pollutant.upper() == re.sub(r'<[^>]+>', '', measure['acronym']):
+                    sensor_nodes_aqi[sensor_node] = int(measure['value'])
+        return sensor_nodes_aqi
+    sensor_nodes_aqi = time_stage(results, 'sensor_mapping', sensor_mapping, args, sensors=len(sensors))
+    if not sensor_nodes_aqi:
+        raise ValueError(f'No sensor measures {args.pollutant.upper()}, real-time stages would run on an empty mask')
+
+    mask = time_stage(results, 'expand_mask', lambda: expand_mask(G, sensor_nodes_aqi, args.sensor_radius),
+        args, hops=args.sensor_radius)
+    mask = {**mask, **sensor_nodes_aqi}
+
+    # MAMP modifies the graph in place, hence each run starts from a copy
+    G_mamp = time_stage(results, 'mamp', lambda H: MAMP(H, mask, sensor_nodes_aqi, max_epochs=args.mamp_epochs),
+        args, setup=G.copy, epochs=args.mamp_epochs)
+
+    # single MAMP epoch, starting from the initialised node weights (MAMP_epoch does not modify its input)
+    G_init = MAMP(G.copy(), mask, sensor_nodes_aqi, max_epochs=0)
+    time_stage(results, 'mamp_epoch', lambda: MAMP_epoch(G_init, mask), args)
+    results['mamp']['seconds_per_epoch'] = results['mamp_epoch']['seconds']
+    del G_init
+    G = G_mamp
+
+    # recompute exposure with updated air quality values (as in green-route.py)
+    def exposure_update():
+        for u, v, k in G.edges:
+            G[u][v][k]['exposure'] = exposure(G[u][v][k])
+    time_stage(results, 'exposure_update', exposure_update, args, edges=len(edges))
+    realtime = time_stage(results, 'route_realtime', routes('exposure'), args, routes=len(pairs))
+
+    # json export (as in green-route.py --export-json)
+    with tempfile.TemporaryDirectory() as tmp:
+        def json_export():
+            for i in range(len(pairs)):
+                json_data = {'pollutant': args.pollutant}
+                for name, (_, route) in [('shortest', shortest[i]), ('historical', historical[i]), ('real-time', realtime[i])]:
+                    json_data[name] = route_json(G, route,
+                        nx.path_weight(G, route, 'length'), nx.path_weight(G, route, 'exposure'))
+                with open(os.path.join(tmp, f'{i}.json'), 'w') as f:
+                    json.dump(json_data, f, indent=2)
+        time_stage(results, 'json_export', json_export, args, routes=len(pairs))
+
+    return {
+        'graph': graph_type,
+        'target_edges': target_edges,
+        'nodes': G.number_of_nodes(),
+        'edges': G.number_of_edges(),
+        'workload': {arg: getattr(args, arg) for arg in WORKLOAD_ARGS},
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': results,
+    }
+
+def run_isolated(graph_type, target_edges, args):
+    # each benchmark runs in a fresh process, so that memory measurements do not depend on previous ones
+    with mp.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run, (graph_type, target_edges, args))
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def is_regression(current, previous, tolerance, min_difference, spread=0):
+    # the increase must exceed both the relative tolerance and the absolute noise floor
+    difference = current - previous
+    return difference > tolerance * previous and difference > max(min_difference, spread)
+
+def compare(results, baseline, args):
+    previous = {(b['graph'], b['target_edges']): b for b in baseline['benchmarks']}
+    print(f"Comparison with {baseline.get('commit')} (tolerance {100 * args.tolerance:.0f}%)")
+    regressions = []
+    for benchmark in results['benchmarks']:
+        key = (benchmark['graph'], benchmark['target_edges'])
+        if key not in previous:
+            continue
+        if benchmark['workload'] != previous[key].get('workload'):
+            print(f'{key[0]} ({key[1]} edges): skipped, the baseline has a different workload')
+            continue
+        print(f'{key[0]} ({key[1]} edges)')
+        for name, stage in benchmark['stages'].items():
+            if name not in previous[key]['stages']:
+                continue
+            baseline_stage = previous[key]['stages'][name]
+            line = f'  {name:<24}'
+            # time: medians, with a noise floor given by the spread of the repetitions
+            ratio = stage['seconds_median'] / baseline_stage['seconds_median']
+            spread = args.mad_factor * max(stage['seconds_mad'], baseline_stage['seconds_mad'])
+            regression = is_regression(stage['seconds_median'], baseline_stage['seconds_median'],
+                args.tolerance, args.min_seconds, spread)
+            line += f' time {ratio:6.2f}x{" REGRESSION" if regression else ""}'
+            if regression:
+                regressions.append((key, name, 'time'))
+            # memory
+            if 'traced_peak_mb' in stage and baseline_stage.get('traced_peak_mb'):
+                ratio = stage['traced_peak_mb'] / baseline_stage['traced_peak_mb']
+                regression = is_regression(stage['traced_peak_mb'], baseline_stage['traced_peak_mb'],
+                    args.tolerance, args.min_mb)
+                line += f' memory {ratio:6.2f}x{" REGRESSION" if regression else ""}'
+                if regression:
+                    regressions.append((key, name, 'memory'))
+            print(line)
+    return regressions
+
+def positive_int(value):
+    value = int(value)
+    if value < 1:
+        raise ap.ArgumentTypeError(f'{value} is not a positive integer')
+    return value
+
+if __name__ == "__main__":
+
+    parser = ap.ArgumentParser(formatter_class=lambda prog: ap.HelpFormatter(prog,max_help_position=33))
+    parser.add_argument('--graphs', type=str, nargs='+', choices=list(GRAPHS.keys()), default=list(GRAPHS.keys()),
+        help='types of synthetic graphs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+        help='approximate number of edges of the synthetic graphs')
+    parser.add_argument('--pollutant', type=str, choices=['no2', 'pm25', 'pm10'], default='no2',
+        help='pollutant to consider for air quality data')
+    parser.add_argument('--aqi-points', type=int, default=20000,
+        help='number of points in the synthetic air quality dataset')
+    parser.add_argument('--match-edges', type=int, default=10000,
+        help='number of edges processed by the matching loop (0 for all)')
+    parser.add_argument('--sensors', type=int, default=7, help='number of synthetic sensors')
+    parser.add_argument('--sensor-radius', type=int, default=1,
+        help='extend air quality value of each sensor to its neighbors (up to specified number of hops)')
+    parser.add_argument('--mamp-epochs', type=int, default=2,
+        help='number of epochs of the MAMP interpolation algorithm')
+    parser.add_argument('--routes', type=int, default=5, help='number of origin-destination pairs')
+    parser.add_argument('--repeat', type=positive_int, default=5,
+        help='number of timed runs of each stage')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random number generator')
+    parser.add_argument('--trace-memory', action=ap.BooleanOptionalAction, default=True,
+        help='trace peak memory of each stage with tracemalloc (in an additional untimed run)')
+    parser.add_argument('--output', type=str, default='benchmark.json', help='write results to *.json')
+    parser.add_argument('--baseline', type=str, help='*.json file with previous results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help='relative increase of time or memory w.r.t. the baseline considered a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+        help='increase of time (in seconds) below which no regression is reported')
+    parser.add_argument('--mad-factor', type=float, default=3,
+        help='increase of time below this multiple of the median absolute deviation of the runs is ignored')
+    parser.add_argument('--min-mb', type=float, default=0.1,
+        help='increase of memory (in MB) below which no regression is reported')
+    args, additional = parser.parse_known_args()
+    if args.pollutant.upper() not in SENSOR_MEASURES:
+        parser.error(f'sensors do not measure {args.pollutant} (as in data/test.json), '
+            f'choose among {", ".join(p.lower() for p in SENSOR_MEASURES)}')
+
+    # read the baseline first, since it may be overwritten by the output
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'networkx': nx.__version__,
+        'osmnx': ox.__version__,
+        'platform': platform.platform(),
+        'args': vars(args),
+        'benchmarks': [],
+    }
+    for graph_type in args.graphs:
+        for size in args.sizes:
+            results['benchmarks'].append(run_isolated(graph_type, size, args))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}')
+
+    if args.baseline is not None:
+        regressions = compare(results, baseline, args)
+        if regressions:
+            print(f'{len(regressions)} regression(s) detected')
+            sys.exit(1)
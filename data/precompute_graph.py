@@ -1,13 +1,15 @@
-from sklearn.neighbors import BallTree
 from progress import test_progress
 import argparse as ap
 import networkx as nx
 import pandas as pd
 import osmnx as ox
-import numpy as np
 import pickle
+import sys
 import os
 
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from air_quality import aqi_ball_tree, store_closest_aqi
+
 
 if __name__ == '__main__':
 
@@ -21,8 +23,7 @@ if __name__ == '__main__':
     aqi = pd.read_csv(args.aqi)
 
     # construct a ball tree to efficiently find closest points later
-    aqi_nodes_rad = np.deg2rad(aqi[['LATITUDE', 'LONGITUDE']]) # haversine requires lat, lon coordinates in radians
-    aqi_ball_tree = BallTree(aqi_nodes_rad, metric='haversine')
+    ball_tree = aqi_ball_tree(aqi)
 
     # obtain map from OpenStreetMap
     ox.settings.use_cache = True
@@ -34,14 +35,8 @@ if __name__ == '__main__':
         progress.console.print('Storing air quality indices on the edges of the graph')
         # for each edge in the graph...
         for u, v, k in G.edges:
-            # find the closest point in air quality index dataset to the middle of the current edge
-            middle_latlon = (G.nodes[u]['y'] + G.nodes[v]['y']) / 2, (G.nodes[u]['x'] + G.nodes[v]['x']) / 2
-            middle_latlon_rad = np.deg2rad(middle_latlon)
-            dist, idx = aqi_ball_tree.query(middle_latlon_rad.reshape(1, -1), k=1)
-            closest = aqi.iloc[idx[:, 0]]
-            # store air quality indices of closest point on the current edge
-            for pollutant in ['NO2', 'PM25', 'PM10']:
-                G[u][v][k][pollutant] = closest[[pollutant]].values[0].item()
+            # store air quality indices of the closest point in the dataset on the current edge
+            store_closest_aqi(G, u, v, k, aqi, ball_tree)
             #progress.console.print(G.get_edge_data(u, v))
             progress.update(task, advance=1)
 
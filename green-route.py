@@ -10,6 +10,8 @@ import os
 import re
 
 from mamp import MAMP, expand_mask
+from air_quality import aqi, exposure
+from routes import decompose_coordinates, route_json
 
 def point_trace(point, name='Point', color='black', label=None, group=None, group_title=None):
     if color is not None:
@@ -35,15 +37,6 @@ def point_trace(point, name='Point', color='black', label=None, group=None, grou
         legendgrouptitle_text=group_title,
     )
 
-def decompose_coordinates(G, nodes):
-    X = []
-    Y = []
-    for node in nodes:
-        point = G.nodes[node]
-        X.append(point['x'])
-        Y.append(point['y'])
-    return X, Y
-
 def route_trace(G, route, name='Route', color='blue', group=None, group_title=None):
     X, Y = decompose_coordinates(G, route)
     return go.Scattermapbox(
@@ -95,23 +88,9 @@ if __name__ == "__main__":
     origin_node = ox.nearest_nodes(G, origin_point[1], origin_point[0])
     destination_node = ox.nearest_nodes(G, destination_point[1], destination_point[0])
 
-    # air quality index function
-    def aqi(edge_data):
-        aqi_data = edge_data[args.pollutant.upper()].split(' ')[0]
-        if aqi_data.startswith('>'):
-            aqi_value = 1.5 * float(aqi_data[1:])
-        else:
-            aqi_range = [float(n) for n in aqi_data.split('-')]
-            aqi_value = (aqi_range[0] + aqi_range[0]) / 2
-        return aqi_value
-
-    # exposure function
-    def exposure(edge_data):
-        return edge_data['length'] * edge_data['aqi']
-
     # store air quality index and exposure on each edge
     for u, v, k in G.edges:
-        G[u][v][k]['aqi'] = aqi(G[u][v][k])
+        G[u][v][k]['aqi'] = aqi(G[u][v][k], args.pollutant)
         G[u][v][k]['exposure'] = exposure(G[u][v][k])
 
     # compute shortest route
@@ -196,23 +175,11 @@ if __name__ == "__main__":
                 'address': args.destination,
                 'coordinates': destination_point.tolist()
             },
-            'shortest': {
-                'route': list(zip(*decompose_coordinates(G, shortest_route))),
-                'distance': shortest_distance,
-                'exposure': shortest_exposure,
-            },
-            'historical': {
-                'route': list(zip(*decompose_coordinates(G, historical_route))),
-                'distance': historical_distance,
-                'exposure': historical_exposure,
-            }
+            'shortest': route_json(G, shortest_route, shortest_distance, shortest_exposure),
+            'historical': route_json(G, historical_route, historical_distance, historical_exposure),
         }
         if args.real_time is not None:
-            json_data['real-time'] = {
-                'route': list(zip(*decompose_coordinates(G, realtime_route))),
-                'distance': realtime_distance,
-                'exposure': realtime_exposure,
-            }
+            json_data['real-time'] = route_json(G, realtime_route, realtime_distance, realtime_exposure)
         with open(args.export_json, 'w') as f:
             json.dump(json_data, f, indent=2)
             print(f'Results written to {args.export_json}')
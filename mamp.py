@@ -54,6 +54,18 @@ def aggregate(nodes, weight):
 def combine(h, m):
     return (h + m) / 2
 
+# Compute one epoch of MAMP, returning the graph in the next iteration
+def MAMP_epoch(G, mask, weight='aqi'):
+    G_next = G.copy()
+    for node in G.nodes:
+        neighbors = [G.nodes[neighbor] for neighbor in G.neighbors(node)]
+        m = aggregate(neighbors, weight)
+        h = combine(G.nodes[node][weight], m)
+        G_next.nodes[node][weight] = h
+    # re-establish sensor nodes' values
+    nx.set_node_attributes(G_next, mask, weight)
+    return G_next
+
 def MAMP(G, mask, sensors, weight='aqi', max_epochs=2, max_mse=5e-3):
     print('Running MAMP algorithm')
     # initialise nodes' weights
@@ -66,20 +78,13 @@ def MAMP(G, mask, sensors, weight='aqi', max_epochs=2, max_mse=5e-3):
         # compute the current weights
         #G_weights = np.array(list(nx.get_node_attributes(G, weight).values()))
         # compute the graph in the next iteration
-        G_next = G.copy()
-        for node in G.nodes:
-            neighbors = [G.nodes[neighbor] for neighbor in G.neighbors(node)]
-            m = aggregate(neighbors, weight)
-            h = combine(G.nodes[node][weight], m)
-            G_next.nodes[node][weight] = h
+        G_next = MAMP_epoch(G, mask, weight)
         # compute the weights of the next iteration
         #G_next_weights = np.array(list(nx.get_node_attributes(G_next, weight).values()))
         # compute the MSE loss
         #mse = np.mean((G_weights - G_next_weights) ** 2)
         # advance graph to the next iteration
         G = G_next
-        # re-establish sensor nodes' values
-        nx.set_node_attributes(G, mask, weight)
         # check for early-stopping criterion
         #if mse < max_mse:
         #    break
@@ -0,0 +1,15 @@
+def decompose_coordinates(G, nodes):
+    X = []
+    Y = []
+    for node in nodes:
+        point = G.nodes[node]
+        X.append(point['x'])
+        Y.append(point['y'])
+    return X, Y
+
+def route_json(G, route, distance, exposure):
+    return {
+        'route': list(zip(*decompose_coordinates(G, route))),
+        'distance': distance,
+        'exposure': exposure,
+    }